@@ -0,0 +1,62 @@
+"""
+Cache Helper Functions
+
+Redis helper functions for caching read-heavy API responses.
+Caching is optional: when REDIS_URL is not set every helper is a no-op
+and endpoints fall through to MongoDB.
+"""
+
+import logging
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger("uvicorn.error")
+
+cache = None
+
+redis_url = os.getenv("REDIS_URL")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", 300))
+
+if redis_url:
+    from redis.asyncio import Redis
+
+    # Short timeouts so an unreachable Redis degrades to a cache miss, not a hang
+    cache = Redis.from_url(redis_url, socket_connect_timeout=0.25, socket_timeout=0.25)
+
+
+async def cache_get(key: str) -> Optional[bytes]:
+    """Return the cached bytes for key, or None on miss or cache error"""
+    if cache is None:
+        return None
+    try:
+        return await cache.get(key)
+    except Exception as e:
+        logger.warning("Cache get failed for %s: %s", key, e)
+        return None
+
+
+async def cache_set(key: str, value: bytes, ttl: int = CACHE_TTL_SECONDS) -> None:
+    """Store serialized bytes under key with an expiry; cache errors are ignored"""
+    if cache is None:
+        return
+    try:
+        await cache.set(key, value, ex=ttl)
+    except Exception as e:
+        logger.warning("Cache set failed for %s: %s", key, e)
+
+
+async def cache_invalidate(pattern: str) -> None:
+    """Delete every key matching a glob pattern (e.g. "products:*")"""
+    if cache is None:
+        return
+    try:
+        keys = [key async for key in cache.scan_iter(match=pattern)]
+        if keys:
+            await cache.delete(*keys)
+    except Exception as e:
+        logger.warning("Cache invalidation failed for %s: %s", pattern, e)
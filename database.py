@@ -5,11 +5,12 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import WriteConcern
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
-from typing import Union
+from typing import Optional, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
@@ -22,12 +23,17 @@ database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    # Keep a warm pool per worker process
+    _client = AsyncIOMotorClient(
+        database_url,
+        minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 5)),
+        maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 50)),
+    )
     db = _client[database_name]
 
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
+async def create_document(collection_name: str, data: Union[BaseModel, dict], write_concern: Optional[WriteConcern] = None):
+    """Insert a single document with timestamp, optionally overriding the write concern"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
@@ -40,10 +46,11 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
-    result = db[collection_name].insert_one(data_dict)
+    collection = db.get_collection(collection_name, write_concern=write_concern)
+    result = await collection.insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
     """Get documents from collection"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
@@ -52,4 +59,12 @@ def get_documents(collection_name: str, filter_dict: dict = None, limit: int = N
     if limit:
         cursor = cursor.limit(limit)
     
-    return list(cursor)
+    return await cursor.to_list(length=None)
+
+async def bulk_fetch_by_ids(collection_name: str, ids: list, projection: dict = None):
+    """Fetch documents by _id in one query, keyed by string id"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    cursor = db[collection_name].find({"_id": {"$in": list(ids)}}, projection)
+    return {str(doc["_id"]): doc async for doc in cursor}
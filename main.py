@@ -1,41 +1,113 @@
+import asyncio
+import hashlib
+import logging
 import os
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
+import orjson
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
-
-from database import db, create_document, get_documents
-from schemas import Product as ProductSchema, Order as OrderSchema, OrderItem as OrderItemSchema
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from typing import List, Optional, Dict, Any, Tuple
+from bson import ObjectId
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError
+
+from database import db, create_document, get_documents, bulk_fetch_by_ids
+from cache import cache_get, cache_set, cache_invalidate
+from schemas import (
+    Product as ProductSchema,
+    ProductOut,
+    ProductListResponse,
+    CategoriesResponse,
+    Order as OrderSchema,
+    OrderItem as OrderItemSchema,
+)
 
-app = FastAPI(title="UMKM Food Commerce API")
+logger = logging.getLogger("uvicorn.error")
+
+# Environment is fixed for the life of the process; read it once for /test
+_DB_URL_SET = bool(os.getenv("DATABASE_URL"))
+_DB_NAME_SET = bool(os.getenv("DATABASE_NAME"))
+
+# Comma-separated list of frontend origins. Defaults to "*" so existing
+# deployments keep working; set it to the frontend URL(s) to restrict access.
+cors_origins = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "*").split(",")
+    if origin.strip()
+]
+
+_WARMUP_PING_TIMEOUT = 2
+_WARMUP_RETRY_SECONDS = 5
+
+
+async def prepare_database() -> None:
+    """Ping Mongo, build indexes and seed, retrying until the server answers"""
+    while True:
+        try:
+            # Short ping so an unreachable server fails fast instead of waiting
+            # out the driver's 30s server selection timeout
+            await asyncio.wait_for(db.command("ping"), timeout=_WARMUP_PING_TIMEOUT)
+            await ensure_indexes()
+            await seed_products_if_empty()
+            return
+        except Exception as e:
+            logger.warning("Database warm-up failed, retrying in %ss: %s", _WARMUP_RETRY_SECONDS, e)
+            await asyncio.sleep(_WARMUP_RETRY_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("CORS allowed origins: %s", ", ".join(cors_origins) or "(none)")
+    # Warm up in the background so /, /api/hello and /test serve immediately
+    # even when Mongo is down, and indexes/seed data appear once it is back
+    warmup = asyncio.create_task(prepare_database()) if db is not None else None
+    yield
+    if warmup is not None:
+        warmup.cancel()
+
+
+app = FastAPI(
+    title="UMKM Food Commerce API",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=cors_origins,
+    # With "*", Starlette echoes the request Origin for credentialed requests,
+    # so this matches the previous wildcard behaviour
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type", "authorization", "if-none-match"],
+    expose_headers=["ETag"],
+    # Let browsers cache preflight responses for a day
+    max_age=86400,
 )
 
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "UMKM Food Commerce API is running"}
 
 
 @app.get("/api/hello")
-def hello():
+async def hello():
     return {"message": "Hello from the backend API!"}
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     """Test endpoint to check if database is available and accessible"""
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
-        "database_url": None,
-        "database_name": None,
+        "database_url": "✅ Set" if _DB_URL_SET else "❌ Not Set",
+        "database_name": "✅ Set" if _DB_NAME_SET else "❌ Not Set",
         "connection_status": "Not Connected",
         "collections": []
     }
@@ -43,11 +115,10 @@ def test_database():
     try:
         if db is not None:
             response["database"] = "✅ Available"
-            response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-            response["database_name"] = getattr(db, 'name', None) or ("✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set")
+            response["database_name"] = getattr(db, 'name', None) or response["database_name"]
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -57,18 +128,19 @@ def test_database():
     except Exception as e:
         response["database"] = f"❌ Error: {str(e)[:80]}"
 
-    response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-    response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
-
     return response
 
 
 # ---------- Schemas for requests ----------
 class CreateOrderItem(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     product_id: str
     quantity: int = Field(..., ge=1)
 
 class CreateOrderRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     customer_name: Optional[str] = None
     customer_phone: Optional[str] = None
     customer_address: Optional[str] = None
@@ -76,64 +148,154 @@ class CreateOrderRequest(BaseModel):
     notes: Optional[str] = None
 
 
-# ---------- Seed sample products if empty ----------
-def seed_products_if_empty() -> None:
+# create_order reads the raw body, so document it by hand. Nested models are
+# referenced through components so the refs resolve inside the OpenAPI document.
+_ORDER_REQUEST_SCHEMA = CreateOrderRequest.model_json_schema(ref_template="#/components/schemas/{model}")
+_ORDER_REQUEST_DEFS = _ORDER_REQUEST_SCHEMA.pop("$defs", {})
+
+
+# Fields needed by product listing views; full documents come from the detail endpoint
+LIST_PROJECTION: Dict[str, int] = {
+    "name": 1,
+    "price": 1,
+    "category": 1,
+    "image": 1,
+    "vendor": 1,
+    "rating": 1,
+    "in_stock": 1,
+    "tags": 1,
+}
+
+
+# Orders are acknowledged by the primary only, without waiting for the journal
+# or replica-set majority. Trade-off: an order acked just before a primary
+# crash can be lost; switch to WriteConcern("majority", j=True) if that matters.
+ORDER_WRITE_CONCERN = WriteConcern(w=1, j=False)
+
+
+def parse_object_ids(ids: List[str]) -> List[ObjectId]:
+    """Convert id strings to ObjectIds, rejecting the batch before any DB work"""
+    invalid = [i for i in ids if not ObjectId.is_valid(i)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid product id: {', '.join(invalid)}")
+    return [ObjectId(i) for i in ids]
+
+
+# ---------- Indexes ----------
+async def ensure_indexes() -> None:
     if db is None:
         return
-    count = db["product"].count_documents({})
-    if count > 0:
-        return
-    sample_products: List[Dict[str, Any]] = [
-        {
-            "name": "Strawberry Bubble Tea",
-            "description": "Refreshing strawberry milk tea with chewy tapioca pearls.",
-            "price": 18000,
-            "category": "Drinks",
-            "image": "https://images.unsplash.com/photo-1613478223719-2ab802602423?q=80&w=1200&auto=format&fit=crop",
-            "vendor": "Boba Bliss UMKM",
-            "rating": 4.7,
-            "tags": ["boba", "strawberry", "sweet"],
-            "in_stock": True,
-        },
-        {
-            "name": "Classic Milk Tea",
-            "description": "Smooth black tea with creamy milk and brown sugar pearls.",
-            "price": 16000,
-            "category": "Drinks",
-            "image": "https://images.unsplash.com/photo-1592861956120-e524fc739696?q=80&w=1200&auto=format&fit=crop",
-            "vendor": "Kopi & Teh Lokal",
-            "rating": 4.6,
-            "tags": ["boba", "milk tea"],
-            "in_stock": True,
-        },
-        {
-            "name": "Spicy Chicken Skewers",
-            "description": "Grilled chicken satay with homemade spicy sauce.",
-            "price": 22000,
-            "category": "Snacks",
-            "image": "https://images.unsplash.com/photo-1666001085700-0610a7f0b11d?q=80&w=1200&auto=format&fit=crop",
-            "vendor": "Satay UMKM",
-            "rating": 4.4,
-            "tags": ["spicy", "protein"],
-            "in_stock": True,
-        },
-        {
-            "name": "Chocolate Banana Crepes",
-            "description": "Soft crepes filled with banana and chocolate drizzle.",
-            "price": 15000,
-            "category": "Dessert",
-            "image": "https://images.unsplash.com/photo-1541599188778-cdc73298e8f8?q=80&w=1200&auto=format&fit=crop",
-            "vendor": "Manis Lokal",
-            "rating": 4.8,
-            "tags": ["dessert", "sweet"],
-            "in_stock": True,
-        },
+    # create_index is idempotent, so this is safe on every startup
+    specs = [
+        ("product", [("name", "text"), ("description", "text"), ("tags", "text")], {"name": "product_text"}),
+        # Also serves category-only filters via its prefix
+        ("product", [("category", 1), ("name", 1)], {}),
+        # Backs seeding: concurrent workers' seed rows collide here instead of
+        # duplicating. Partial, so products without a vendor are unconstrained.
+        (
+            "product",
+            [("vendor", 1), ("name", 1)],
+            {"unique": True, "partialFilterExpression": {"vendor": {"$exists": True}}},
+        ),
     ]
-    db["product"].insert_many(sample_products)
+    created = []
+    for collection_name, keys, options in specs:
+        try:
+            created.append(await db[collection_name].create_index(keys, **options))
+        except Exception as e:
+            # Log and carry on so a bad index build can't keep the app from starting
+            logger.warning("Failed to create index %s on %s: %s", keys, collection_name, e)
+    logger.info("MongoDB indexes ready: %s", ", ".join(created))
+
+
+# ---------- Seed sample products if empty ----------
+_SAMPLE_PRODUCTS: Tuple[Dict[str, Any], ...] = (
+    {
+        "name": "Strawberry Bubble Tea",
+        "description": "Refreshing strawberry milk tea with chewy tapioca pearls.",
+        "price": 18000,
+        "category": "Drinks",
+        "image": "https://images.unsplash.com/photo-1613478223719-2ab802602423?q=80&w=1200&auto=format&fit=crop",
+        "vendor": "Boba Bliss UMKM",
+        "rating": 4.7,
+        "tags": ["boba", "strawberry", "sweet"],
+        "in_stock": True,
+    },
+    {
+        "name": "Classic Milk Tea",
+        "description": "Smooth black tea with creamy milk and brown sugar pearls.",
+        "price": 16000,
+        "category": "Drinks",
+        "image": "https://images.unsplash.com/photo-1592861956120-e524fc739696?q=80&w=1200&auto=format&fit=crop",
+        "vendor": "Kopi & Teh Lokal",
+        "rating": 4.6,
+        "tags": ["boba", "milk tea"],
+        "in_stock": True,
+    },
+    {
+        "name": "Spicy Chicken Skewers",
+        "description": "Grilled chicken satay with homemade spicy sauce.",
+        "price": 22000,
+        "category": "Snacks",
+        "image": "https://images.unsplash.com/photo-1666001085700-0610a7f0b11d?q=80&w=1200&auto=format&fit=crop",
+        "vendor": "Satay UMKM",
+        "rating": 4.4,
+        "tags": ["spicy", "protein"],
+        "in_stock": True,
+    },
+    {
+        "name": "Chocolate Banana Crepes",
+        "description": "Soft crepes filled with banana and chocolate drizzle.",
+        "price": 15000,
+        "category": "Dessert",
+        "image": "https://images.unsplash.com/photo-1541599188778-cdc73298e8f8?q=80&w=1200&auto=format&fit=crop",
+        "vendor": "Manis Lokal",
+        "rating": 4.8,
+        "tags": ["dessert", "sweet"],
+        "in_stock": True,
+    },
+)
+
+_seeded = False
 
 
-@app.get("/api/products")
-def list_products(category: Optional[str] = None, q: Optional[str] = None):
+async def seed_products_if_empty() -> None:
+    global _seeded
+    if db is None or _seeded:
+        return
+    count = await db["product"].count_documents({})
+    if count > 0:
+        _seeded = True
+        return
+    # Copy each dict: insert_many adds _id to the documents it is given
+    try:
+        await db["product"].insert_many([dict(p) for p in _SAMPLE_PRODUCTS], ordered=False)
+    except BulkWriteError as e:
+        # Another worker seeded concurrently; the unique (vendor, name) index
+        # from ensure_indexes rejects its rows as duplicates
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+    await cache_invalidate("products:*")
+    await cache_invalidate("categories")
+    _seeded = True
+
+
+def cacheable_json_response(request: Request, body: bytes, max_age: int = 60) -> Response:
+    """Serve a JSON body with an ETag, answering 304 when the client copy is current"""
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    # If-None-Match uses weak comparison (RFC 9110), so ignore any W/ prefix
+    # that proxies or compression layers may have added
+    tags = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Pre-serialized Response bodies bypass response_model validation; the
+# models still drive the OpenAPI schema and validate the dict fallbacks.
+@app.get("/api/products", response_model=ProductListResponse, response_model_exclude_unset=True)
+async def list_products(request: Request, category: Optional[str] = None, q: Optional[str] = None):
     if db is None:
         # Fallback to static list if db isn't configured
         fallback = [
@@ -141,54 +303,103 @@ def list_products(category: Optional[str] = None, q: Optional[str] = None):
         ]
         return {"items": fallback}
 
-    seed_products_if_empty()
+    # urlencode escapes ":" and "&" so distinct (category, q) pairs never share a key
+    cache_key = "products:" + urlencode({"category": category or "", "q": q or ""})
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        # Cached bodies are already serialized JSON
+        return cacheable_json_response(request, cached)
 
     filter_dict: Dict[str, Any] = {}
     if category:
         filter_dict["category"] = category
     if q:
-        filter_dict["$or"] = [
-            {"name": {"$regex": q, "$options": "i"}},
-            {"description": {"$regex": q, "$options": "i"}},
-            {"tags": {"$regex": q, "$options": "i"}},
-        ]
+        filter_dict["$text"] = {"$search": q}
 
-    items = list(db["product"].find(filter_dict))
-    for it in items:
-        it["_id"] = str(it["_id"])  # Serialize ObjectId
-    return {"items": items}
+    cursor = db["product"].find(filter_dict, LIST_PROJECTION).batch_size(200)
+    if q:
+        # Most relevant matches first
+        cursor = cursor.sort([("score", {"$meta": "textScore"})])
+    # Serialize ObjectId while streaming instead of in a second pass
+    items = [{**doc, "_id": str(doc["_id"])} async for doc in cursor]
+    body = orjson.dumps({"items": items})
+    await cache_set(cache_key, body)
+    return cacheable_json_response(request, body)
 
 
-@app.get("/api/categories")
-def list_categories():
+@app.get("/api/products/{product_id}", response_model=ProductOut, response_model_exclude_unset=True)
+async def get_product(product_id: str):
     if db is None:
-        return {"categories": ["Drinks", "Snacks", "Dessert"]}
-    seed_products_if_empty()
-    cats = db["product"].distinct("category")
-    return {"categories": cats}
+        raise HTTPException(status_code=404, detail=f"Product not found: {product_id}")
+    oid = parse_object_ids([product_id])[0]
+    prod = await db["product"].find_one({"_id": oid})
+    if not prod:
+        raise HTTPException(status_code=404, detail=f"Product not found: {product_id}")
+    prod["_id"] = str(prod["_id"])
+    return prod
 
 
-@app.post("/api/orders")
-def create_order(payload: CreateOrderRequest):
+@app.get("/api/categories", response_model=CategoriesResponse)
+async def list_categories():
+    if db is None:
+        return {"categories": ["Drinks", "Snacks", "Dessert"]}
+    cached = await cache_get("categories")
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    cats = await db["product"].distinct("category")
+    body = orjson.dumps({"categories": cats})
+    await cache_set("categories", body)
+    return Response(content=body, media_type="application/json")
+
+
+@app.post(
+    "/api/orders",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _ORDER_REQUEST_SCHEMA}},
+        }
+    },
+)
+async def create_order(request: Request):
+    # Parse and validate the raw body in one pass with pydantic-core
+    try:
+        payload = CreateOrderRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        # Match FastAPI's own body errors, whose loc starts with "body"
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        )
+
     # Build order items snapshot with current product data
     if not payload.items:
         raise HTTPException(status_code=400, detail="No items provided")
 
-    order_items: List[OrderItemSchema] = []
-    subtotal = 0.0
-
-    for line in payload.items:
-        # Find product
-        prod = None
-        if db is not None:
-            prod = db["product"].find_one({"_id": __import__('bson').ObjectId(line.product_id)}) if line.product_id else None
-        if not prod:
-            raise HTTPException(status_code=404, detail=f"Product not found: {line.product_id}")
-        name = prod.get("name")
-        price = float(prod.get("price", 0))
-        quantity = int(line.quantity)
-        subtotal += price * quantity
-        order_items.append(OrderItemSchema(product_id=str(prod.get("_id")), name=name, price=price, quantity=quantity))
+    oids = parse_object_ids([line.product_id for line in payload.items])
+
+    # Fetch every referenced product in a single round trip
+    prods: Dict[str, Dict[str, Any]] = {}
+    if db is not None:
+        # Only the snapshot fields travel over the wire
+        prods = await bulk_fetch_by_ids("product", oids, {"name": 1, "price": 1})
+
+    missing = [line.product_id for line, oid in zip(payload.items, oids) if str(oid) not in prods]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Product not found: {', '.join(missing)}")
+
+    pairs = [(line, prods[str(oid)]) for line, oid in zip(payload.items, oids)]
+    # Product fields come from our own collection and quantities were validated
+    # with the request, so skip re-validating each line item
+    order_items: List[OrderItemSchema] = [
+        OrderItemSchema.model_construct(
+            product_id=str(prod["_id"]),
+            name=prod["name"],
+            price=float(prod.get("price", 0)),
+            quantity=line.quantity,
+        )
+        for line, prod in pairs
+    ]
+    subtotal = sum(item.price * item.quantity for item in order_items)
 
     order_doc = OrderSchema(
         customer_name=payload.customer_name,
@@ -200,15 +411,28 @@ def create_order(payload: CreateOrderRequest):
     )
 
     try:
-        order_id = create_document("order", order_doc)
+        order_id = await create_document("order", order_doc, write_concern=ORDER_WRITE_CONCERN)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
 
     return {"message": "Order created", "order_id": order_id}
 
 
+_default_openapi = app.openapi
+
+
+def openapi() -> Dict[str, Any]:
+    """OpenAPI schema including the models referenced by the order request body"""
+    schema = _default_openapi()
+    schema.setdefault("components", {}).setdefault("schemas", {}).update(_ORDER_REQUEST_DEFS)
+    return schema
+
+
+app.openapi = openapi
+
+
 @app.get("/schema")
-def get_schema_definitions():
+async def get_schema_definitions():
     """Expose Pydantic schema models for tooling."""
     return {
         "product": ProductSchema.model_json_schema(),
@@ -219,4 +443,8 @@ def get_schema_definitions():
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # I/O-bound API: 2 * cores + 1 workers, capped to keep Mongo connection counts sane
+    workers_default = min(2 * (os.cpu_count() or 1) + 1, 8)
+    workers = int(os.getenv("WEB_CONCURRENCY", workers_default))
+    # Multiple workers require an import string rather than the app object
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)
@@ -11,7 +11,7 @@ Model name is converted to lowercase for the collection name:
 - BlogPost -> "blogs" collection
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
 
 class User(BaseModel):
@@ -40,6 +40,20 @@ class Product(BaseModel):
     tags: Optional[List[str]] = Field(default_factory=list, description="Tags for filtering")
     in_stock: bool = Field(True, description="Whether product is in stock")
 
+class ProductOut(Product):
+    """
+    Product as returned by the API (not a collection)
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: Optional[str] = Field(None, alias="_id", description="Product id as string")
+
+class ProductListResponse(BaseModel):
+    items: List[ProductOut] = Field(..., description="Matching products")
+
+class CategoriesResponse(BaseModel):
+    categories: List[str] = Field(..., description="Distinct product categories")
+
 class OrderItem(BaseModel):
     product_id: str = Field(..., description="Referenced product id as string")
     name: str = Field(..., description="Snapshot of product name")